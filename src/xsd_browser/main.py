@@ -3,22 +3,25 @@
 # Original work (c) 2023 David Koňařík
 # Modified work (c) 2026 Roman Hořeňovský, TamTam Research s.r.o.
 
+import contextlib
+import functools
 import importlib.metadata
 import logging
+import os.path
 import re
 import sys
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import datetime
 from pathlib import Path
 
-import jinja2
 import lxml.etree
-import lxml.objectify
-import minify_html
 
 logger = logging.getLogger("xsd_browser")
 
+_BLANK_RUN = re.compile(r"\n\s*\n")
+
 
 def parse_xml(path):
     logger.info(f"Loading XML: {path}")
@@ -27,9 +30,27 @@ def parse_xml(path):
 
 XSD = "http://www.w3.org/2001/XMLSchema"
 
+_SCHEMA_TAG = f"{{{XSD}}}schema"
+_INCLUDE_TAG = f"{{{XSD}}}include"
+_IMPORT_TAG = f"{{{XSD}}}import"
+_ANNOTATION_TAG = f"{{{XSD}}}annotation"
+
+# Queries used by ImportResolver, kept as constants so they hit the compiled XPath cache
+_DEFINITIONS_QUERY = (
+    "xsd:element[@name] | xsd:group[@name]"
+    " | xsd:attributeGroup[@name]"
+    " | xsd:complexType[@name] | xsd:simpleType[@name]"
+)
+_REFERENCE_ATTRS = ("type", "base", "ref", "substitutionGroup")
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled_xpath(query):
+    return lxml.etree.XPath(query, namespaces={"xsd": XSD})
+
 
 def xpath(elem, query):
-    return elem.xpath(query, namespaces={"xsd": XSD})
+    return _compiled_xpath(query)(elem)
 
 
 def xpath_one(elem, query):
@@ -41,78 +62,111 @@ def prettyprint_xml(elem):
     elem = deepcopy(elem)
     for e in elem.iter():
         if isinstance(e.tag, str):
-            e.tag = lxml.etree.QName(e.tag).localname
+            e.tag = e.tag.rpartition("}")[2]
     if not isinstance(elem, lxml.etree._Comment):
         lxml.etree.cleanup_namespaces(elem)
     return lxml.etree.tostring(elem, pretty_print=True).decode()
 
 
-def elem_type(elem):
-    return {
+_ELEM_TYPE_BY_TAG = {
+    f"{{{XSD}}}{local}": category
+    for local, category in {
         "element": "element",
         "simpleType": "type",
         "complexType": "type",
         "group": "group",
         "attributeGroup": "attribute-group",
-    }[elem.tag.split("}")[1]]
+    }.items()
+}
+_DEFINITION_TAGS = frozenset(
+    f"{{{XSD}}}{local}"
+    for local in ("element", "group", "attributeGroup", "complexType", "simpleType")
+)
+
+
+def elem_type(elem):
+    return _ELEM_TYPE_BY_TAG[elem.tag]
 
 
 def elem_path(elem):
-    path = []
-    while elem is not None:
-        if "name" in elem.attrib:
-            path.append(elem.attrib["name"])
-        elem = elem.getparent()
+    attrib = elem.attrib
+    path = [attrib["name"]] if "name" in attrib else []
+    path.extend(a.attrib["name"] for a in elem.iterancestors() if "name" in a.attrib)
     return path
 
 
+# Memoized per element: the template asks for the same nodes' attributes repeatedly.
+# Keying on the element keeps its lxml proxy alive, so identity stays stable.
+@functools.lru_cache(maxsize=None)
 def elem_path_attrs(elem):
     path = elem_path(elem)
     return {
         "data-name": path[0],
-        "data-substgroup": elem.attrib.get("substitutionGroup", ""),
+        "data-substgroup": elem.get("substitutionGroup", ""),
         "data-path": "/".join(path),
     }
 
 
+@functools.lru_cache(maxsize=None)
 def elem_name_attrs(elem):
     attrs = {}
     if "name" in elem.attrib:
         attrs["data-name"] = elem.attrib["name"]
     parent = elem.getparent()
-    if parent is not None and parent.tag == f"{{{XSD}}}schema":
+    if parent is not None and parent.tag == _SCHEMA_TAG:
         attrs["data-belowroot"] = True
     return attrs
 
 
+def _includes(doc):
+    # Snapshot: merging imported schemas appends their include/import elements
+    # to the main schema, and those must not be resolved against the root path
+    return list(doc.getroot().iterchildren(_INCLUDE_TAG, _IMPORT_TAG))
+
+
+def _include_path(include_el, path):
+    # Resolved str rather than Path: these are hashed on every include
+    location = include_el.attrib["schemaLocation"]
+    return os.path.realpath(os.path.join(os.path.dirname(path), location))
+
+
 class ImportResolver:
     def __init__(self, main_doc):
         self.main_doc = main_doc
-        self.main_schema_el = xpath_one(main_doc, "//xsd:schema")
-        self.imported = set()
-        # Global namespace → prefix registry
+        self.main_schema_el = main_doc.getroot()
+        self.imported: set[str] = set()
+        # Parse results for every reachable schema file, filled in by _parse_imports
+        self._parsed = {}
+        # Global namespace → prefix registry, plus the set of prefixes it hands out
         self.ns_to_prefix = {}
+        self._used_prefixes = set()
         self.root_target_ns = self.main_schema_el.attrib.get("targetNamespace")
+        # lxml builds a fresh dict on every nsmap access, so read it once
+        root_nsmap = self.main_schema_el.nsmap
         # Detect if root schema declares an explicit prefix for its own targetNamespace
         self.root_prefix = ""
         if self.root_target_ns:
-            for pfx, ns_uri in main_doc.getroot().nsmap.items():
+            for pfx, ns_uri in root_nsmap.items():
                 if pfx is not None and ns_uri == self.root_target_ns:
                     self.root_prefix = pfx
                     break
         # Seed from root document's nsmap
-        for pfx, ns_uri in main_doc.getroot().nsmap.items():
+        for pfx, ns_uri in root_nsmap.items():
             if pfx is not None and ns_uri != XSD and ns_uri not in self.ns_to_prefix:
                 if ns_uri == self.root_target_ns and not self.root_prefix:
                     continue
-                self.ns_to_prefix[ns_uri] = pfx
+                self._register_prefix(ns_uri, pfx)
+
+    def _register_prefix(self, ns_uri, pfx):
+        self.ns_to_prefix[ns_uri] = pfx
+        self._used_prefixes.add(pfx)
 
-    def _collect_prefixes_from_schema(self, schema_el):
-        for pfx, ns_uri in schema_el.nsmap.items():
+    def _collect_prefixes_from_schema(self, schema_nsmap):
+        for pfx, ns_uri in schema_nsmap.items():
             if pfx is None or ns_uri == XSD or ns_uri == self.root_target_ns:
                 continue
             if ns_uri not in self.ns_to_prefix:
-                self.ns_to_prefix[ns_uri] = pfx
+                self._register_prefix(ns_uri, pfx)
                 logger.info(f"Registering prefix '{pfx}' for namespace {ns_uri}")
 
     def _derive_prefix_from_ns(self, ns_uri):
@@ -120,15 +174,77 @@ class ImportResolver:
         base = last_part.split("_", 1)[0].lower()
         candidate = base
         counter = 2
-        used_prefixes = set(self.ns_to_prefix.values())
-        while candidate in used_prefixes:
+        while candidate in self._used_prefixes:
             candidate = f"{base}{counter}"
             counter += 1
         return candidate
 
+    def _remap_reference(self, val, colon, import_nsmap):
+        """Return ``val`` rewritten to the global prefix registry, or None to keep it.
+
+        ``colon`` is the index of the prefix separator in ``val``.
+        """
+        local_prefix, local = val[:colon], val[colon + 1 :]
+        ref_ns = import_nsmap.get(local_prefix)
+        if ref_ns == XSD:
+            return "xsd:" + local
+        if not ref_ns:
+            return None
+        if ref_ns == self.root_target_ns:
+            if self.root_prefix:
+                return self.root_prefix + ":" + local
+            return local  # root namespace → strip prefix
+        registry_prefix = self.ns_to_prefix.get(ref_ns)
+        if registry_prefix:
+            return registry_prefix + ":" + local
+        logger.warning(f"No registry prefix for {ref_ns}, keeping '{val}'")
+        return None
+
+    def _parse_imports(self, doc, path):
+        """Parse all schemas reachable from ``doc``, one import level at a time.
+
+        libxml2 releases the GIL while parsing, so files on the same level are
+        parsed in parallel. Errors are kept in the futures and re-raised when
+        ``_resolve_imports`` reaches the file, preserving sequential behaviour.
+        """
+        with ThreadPoolExecutor() as executor:
+            level = [(doc, path)]
+            while level:
+                next_level = []
+                for parent_doc, parent_path in level:
+                    for include_el in _includes(parent_doc):
+                        include_path = _include_path(include_el, parent_path)
+                        if include_path in self._parsed:
+                            continue
+                        self._parsed[include_path] = executor.submit(
+                            lxml.etree.parse, include_path
+                        )
+                        next_level.append(include_path)
+                level = [
+                    (self._parsed[p].result(), p)
+                    for p in next_level
+                    if self._parsed[p].exception() is None
+                ]
+
     def handle_imports(self, doc, path):
-        for include_el in xpath(doc, "xsd:include | xsd:import"):
-            include_path = (path.parent / include_el.attrib["schemaLocation"]).resolve()
+        self._parse_imports(doc, path)
+        self._resolve_imports(doc, path)
+
+    def _resolve_imports(self, doc, path):
+        # Depth-first worklist in the same order as a recursive walk: each frame
+        # holds the pending include/import elements of one document, and an
+        # imported schema is merged only after all of its own imports are done.
+        stack = [(iter(_includes(doc)), path, None)]
+        while stack:
+            includes, parent_path, merge_args = stack[-1]
+            include_el = next(includes, None)
+            if include_el is None:
+                stack.pop()
+                if merge_args is not None:
+                    self._merge_import(*merge_args)
+                continue
+
+            include_path = _include_path(include_el, parent_path)
             if include_path in self.imported:
                 continue
 
@@ -136,136 +252,193 @@ class ImportResolver:
             logger.info(f"Importing {include_path}")
 
             try:
-                include_doc = lxml.etree.parse(include_path)
+                # Drop our reference so the document is freed once merged
+                include_doc = self._parsed.pop(include_path).result()
             except OSError:
                 logger.error(f"Cannot read imported schema file: {include_path}")
-                logger.error(f"Referenced from: {path}")
+                logger.error(f"Referenced from: {parent_path}")
                 sys.exit(1)
-            include_schema = xpath_one(include_doc, "//xsd:schema")
-
-            # Collect prefixes from imported schema into global registry
-            self._collect_prefixes_from_schema(include_schema)
-
-            # Determine namespace and prefix for this import
-            ns = include_el.attrib.get("namespace") or include_schema.attrib.get(
-                "targetNamespace"
-            )
-            add_prefix = ""
-
-            if ns and ns != self.root_target_ns:
-                prefix = self.ns_to_prefix.get(ns)
-                if not prefix:
-                    prefix = self._derive_prefix_from_ns(ns)
-                    self.ns_to_prefix[ns] = prefix
-                    logger.info(f"Deriving prefix '{prefix}' for namespace {ns}")
-                add_prefix = prefix + ":"
-                logger.info(f"Using prefix '{add_prefix}' for namespace {ns}")
-            elif ns == self.root_target_ns and self.root_prefix:
-                add_prefix = self.root_prefix + ":"
-                logger.info(f"Namespace {ns} is root with prefix '{self.root_prefix}'")
-            elif ns == self.root_target_ns:
-                logger.info(f"Namespace {ns} is root — not prefixing")
-
-            # Recursively process imports within the imported file
-            self.handle_imports(include_doc, include_path)
-
-            # If we have a prefix, rewrite unprefixed name/ref
-            if add_prefix:
-                # 1) Prefix definition names
-                for el in xpath(
-                    include_schema,
-                    "xsd:element[@name] | xsd:group[@name]"
-                    " | xsd:attributeGroup[@name]"
-                    " | xsd:complexType[@name] | xsd:simpleType[@name]",
-                ):
-                    if ":" not in el.attrib["name"]:
-                        el.attrib["name"] = add_prefix + el.attrib["name"]
-
-                # 2) Prefix ref attributes
-                for el in xpath(include_schema, "//*[@ref]"):
-                    if ":" not in el.attrib["ref"]:
-                        el.attrib["ref"] = add_prefix + el.attrib["ref"]
-
-                # 3) Prefix @type unless builtin
-                for el in xpath(include_schema, "//*[@type]"):
-                    t = el.attrib["type"]
-                    if ":" not in t and not t.startswith("xsd:"):
-                        el.attrib["type"] = add_prefix + t
-
-                # 4) Prefix @base in extension/restriction
-                for el in xpath(include_schema, "//*[@base]"):
-                    b = el.attrib["base"]
-                    if ":" not in b and not b.startswith("xsd:"):
-                        el.attrib["base"] = add_prefix + b
-
-            # 5) Remap cross-namespace prefixes via the global registry
+            include_schema = include_doc.getroot()
             import_nsmap = include_schema.nsmap
-            for attr in ("type", "base", "ref", "substitutionGroup"):
-                for el in xpath(include_schema, f"//*[@{attr}]"):
-                    val = el.attrib[attr]
-                    if ":" not in val:
-                        continue
-                    local_prefix, local = val.split(":", 1)
-                    ref_ns = import_nsmap.get(local_prefix)
-                    if ref_ns == XSD:
-                        el.attrib[attr] = "xsd:" + local
-                        continue
-                    if not ref_ns:
-                        continue
-                    if ref_ns == self.root_target_ns:
-                        if self.root_prefix:
-                            el.attrib[attr] = self.root_prefix + ":" + local
-                        else:
-                            el.attrib[attr] = local  # root namespace → strip prefix
-                    else:
-                        registry_prefix = self.ns_to_prefix.get(ref_ns)
-                        if registry_prefix:
-                            el.attrib[attr] = registry_prefix + ":" + local
-                        else:
-                            logger.warning(
-                                f"No registry prefix for {ref_ns}, keeping '{val}'"
-                            )
-
-            # Append imported schema contents to the main document
-            for el in include_schema:
-                if el.tag == f"{{{XSD}}}annotation":
+            add_prefix = self._register_import(include_el, include_schema, import_nsmap)
+
+            # Process imports within the imported file before merging it
+            merge_args = (include_schema, import_nsmap, add_prefix)
+            stack.append((iter(_includes(include_doc)), include_path, merge_args))
+
+    def _register_import(self, include_el, include_schema, import_nsmap):
+        """Register the imported schema's prefixes and return the prefix for its names."""
+        # Collect prefixes from imported schema into global registry
+        self._collect_prefixes_from_schema(import_nsmap)
+
+        # Determine namespace and prefix for this import
+        ns = include_el.attrib.get("namespace") or include_schema.attrib.get(
+            "targetNamespace"
+        )
+        add_prefix = ""
+
+        if ns and ns != self.root_target_ns:
+            prefix = self.ns_to_prefix.get(ns)
+            if not prefix:
+                prefix = self._derive_prefix_from_ns(ns)
+                self._register_prefix(ns, prefix)
+                logger.info(f"Deriving prefix '{prefix}' for namespace {ns}")
+            add_prefix = prefix + ":"
+            logger.info(f"Using prefix '{add_prefix}' for namespace {ns}")
+        elif ns == self.root_target_ns and self.root_prefix:
+            add_prefix = self.root_prefix + ":"
+            logger.info(f"Namespace {ns} is root with prefix '{self.root_prefix}'")
+        elif ns == self.root_target_ns:
+            logger.info(f"Namespace {ns} is root — not prefixing")
+        return add_prefix
+
+    def _merge_import(self, include_schema, import_nsmap, add_prefix):
+        """Rewrite names and references in an imported schema and merge it."""
+        # If we have a prefix, rewrite unprefixed definition names
+        if add_prefix:
+            for el in xpath(include_schema, _DEFINITIONS_QUERY):
+                if ":" not in el.attrib["name"]:
+                    el.attrib["name"] = add_prefix + el.attrib["name"]
+
+        # Rewrite references in a single walk over the imported schema:
+        # prefix unprefixed ref/type/base, then remap cross-namespace
+        # prefixes via the global registry. Builtins always carry a prefix.
+        for el in include_schema.iter(lxml.etree.Element):
+            attrib = el.attrib
+            for attr in _REFERENCE_ATTRS:
+                val = attrib.get(attr)
+                if val is None:
                     continue
-                self.main_schema_el.append(el)
+                colon = val.find(":")
+                if colon == -1:
+                    if not add_prefix or attr == "substitutionGroup":
+                        continue
+                    val = add_prefix + val
+                    attrib[attr] = val
+                    colon = len(add_prefix) - 1
+                remapped = self._remap_reference(val, colon, import_nsmap)
+                if remapped is not None:
+                    attrib[attr] = remapped
+
+        # Append imported schema contents to the main document
+        for el in include_schema:
+            if el.tag == _ANNOTATION_TAG:
+                continue
+            self.main_schema_el.append(el)
 
 
 def _normalize_xsd_prefixes(schema_el, xsd_prefixes):
     """Rewrite any XSD-namespace prefix (e.g. xs:) to the canonical xsd: form."""
-    for attr in ("type", "base"):
-        for el in schema_el.iter():
-            val = el.attrib.get(attr)
-            if not val or ":" not in val:
+    prefixes = xsd_prefixes - {"xsd"}
+    if not prefixes:
+        return
+    for el in schema_el.iter():
+        attrib = el.attrib
+        for attr in ("type", "base"):
+            val = attrib.get(attr)
+            if not val:
                 continue
-            pfx, local = val.split(":", 1)
-            if pfx in xsd_prefixes and pfx != "xsd":
-                el.attrib[attr] = "xsd:" + local
+            colon = val.find(":")
+            if colon != -1 and val[:colon] in prefixes:
+                attrib[attr] = "xsd:" + val[colon + 1 :]
 
 
 def _prefix_root_elements(elements, add_prefix):
     """Prefix the root document's own definitions with the root namespace prefix."""
     for el in elements:
-        tag = lxml.etree.QName(el.tag).localname if isinstance(el.tag, str) else None
-        if tag in ("element", "group", "attributeGroup", "complexType", "simpleType"):
+        if el.tag in _DEFINITION_TAGS:
             name = el.attrib.get("name", "")
             if name and ":" not in name:
                 el.attrib["name"] = add_prefix + name
 
     # Prefix ref/type/base/substitutionGroup on all descendants of original elements
     for root_el in elements:
-        for attr in ("ref", "substitutionGroup"):
-            for el in root_el.iter():
-                val = el.attrib.get(attr)
+        for el in root_el.iter():
+            attrib = el.attrib
+            for attr in _REFERENCE_ATTRS:
+                val = attrib.get(attr)
                 if val and ":" not in val:
-                    el.attrib[attr] = add_prefix + val
-        for attr in ("type", "base"):
-            for el in root_el.iter():
-                val = el.attrib.get(attr)
-                if val and ":" not in val and not val.startswith("xsd:"):
-                    el.attrib[attr] = add_prefix + val
+                    attrib[attr] = add_prefix + val
+
+
+def _collapse_blank_lines(chunks):
+    """Collapse runs of blank lines in streamed output.
+
+    Trailing whitespace of each chunk is carried into the next one, so a
+    whitespace run is never split across chunks and the result matches
+    collapsing the whole document at once.
+    """
+    pending = ""
+    for chunk in chunks:
+        chunk = pending + chunk
+        body = chunk.rstrip()
+        pending = chunk[len(body):]
+        if body:
+            yield _BLANK_RUN.sub("\n\n", body)
+    yield _BLANK_RUN.sub("\n\n", pending)
+
+
+def _write_chunks(f, chunks):
+    """Write ``chunks`` to ``f`` and return the last non-empty one."""
+    last = ""
+    for chunk in chunks:
+        if chunk:
+            f.write(chunk)
+            last = chunk
+    return last
+
+
+@contextlib.contextmanager
+def _reporting_write_errors(path):
+    """Log an ``OSError`` raised in the block as a failed write and exit."""
+    try:
+        yield
+    except OSError as e:
+        logger.error(f"Failed to write {path}: {e.strerror}")
+        sys.exit(1)
+
+
+def _write_file(path, chunks):
+    """Stream ``chunks`` into ``path``.
+
+    Errors raised while producing chunks (i.e. rendering) propagate unchanged;
+    only I/O errors are reported as a failed write.
+    """
+    with _reporting_write_errors(path):
+        f = path.open("w", encoding="utf-8")
+    try:
+        for chunk in chunks:
+            with _reporting_write_errors(path):
+                f.write(chunk)
+    finally:
+        with _reporting_write_errors(path):
+            f.close()
+
+
+def _bytecode_cache():
+    """Return an on-disk Jinja2 bytecode cache, or ``None`` if it is unavailable.
+
+    The cache is only a speed-up, so an unusable temp directory never fails the
+    run: construction errors disable it, and I/O errors while loading or storing
+    bytecode just fall back to compiling the template.
+    """
+    import jinja2
+
+    class BestEffortBytecodeCache(jinja2.FileSystemBytecodeCache):
+        def load_bytecode(self, bucket):
+            try:
+                super().load_bytecode(bucket)
+            except OSError:
+                bucket.reset()
+
+        def dump_bytecode(self, bucket):
+            with contextlib.suppress(OSError):
+                super().dump_bytecode(bucket)
+
+    try:
+        return BestEffortBytecodeCache(pattern="xsd-browser-%s.cache")
+    except (OSError, RuntimeError):
+        return None
 
 
 def main():
@@ -324,15 +497,18 @@ def main():
         pfx for pfx, ns_uri in main_doc.getroot().nsmap.items()
         if pfx is not None and ns_uri == XSD
     }
-    if xsd_prefixes - {"xsd"}:
-        _normalize_xsd_prefixes(resolver.main_schema_el, xsd_prefixes)
+    _normalize_xsd_prefixes(resolver.main_schema_el, xsd_prefixes)
 
     logger.info("Initializing Jinja2 template...")
+    import jinja2
+
     template_env = jinja2.Environment(
         loader=jinja2.FileSystemLoader(Path(__file__).parent),
         autoescape=True,
         trim_blocks=True,
         lstrip_blocks=True,
+        # Reuse the compiled template across runs (per-user temp dir, keyed by source)
+        bytecode_cache=_bytecode_cache(),
     )
     template_env.add_extension("jinja2.ext.do")
     template_env.filters.update(
@@ -354,36 +530,43 @@ def main():
     except importlib.metadata.PackageNotFoundError:
         version = "dev"
 
-    output = template.render(
-        main_xml_path=input_path,
-        doc=main_doc,
-        usages_by_name=defaultdict(set),
-        ns_to_prefix=resolver.ns_to_prefix,
-        root_target_ns=resolver.root_target_ns,
-        generated_at=datetime.now(),
-        version=version,
-        imported_files=sorted(p.name for p in resolver.imported),
-    )
-
-    output = re.sub(r'\n\s*\n', '\n\n', output)
-
-    if not args.no_minify:
-        logger.info("Minifying HTML...")
-        output = minify_html.minify(output, minify_js=True, minify_css=True)
-
-    if output_path is None:
-        logger.info("Writing to stdout...")
-        sys.stdout.reconfigure(encoding="utf-8")
-        sys.stdout.write(output)
-        if not output.endswith("\n"):
-            sys.stdout.write("\n")
-    else:
-        logger.info(f"Writing output to {output_path}...")
-        try:
-            output_path.write_text(output, encoding="utf-8")
-        except OSError as e:
-            logger.error(f"Failed to write {output_path}: {e.strerror}")
-            sys.exit(1)
+    try:
+        stream = template.stream(
+            main_xml_path=input_path,
+            doc=main_doc,
+            usages_by_name=defaultdict(set),
+            ns_to_prefix=resolver.ns_to_prefix,
+            root_target_ns=resolver.root_target_ns,
+            generated_at=datetime.now(),
+            version=version,
+            imported_files=sorted(os.path.basename(p) for p in resolver.imported),
+        )
+        stream.enable_buffering(size=64)
+
+        if args.no_minify:
+            chunks = _collapse_blank_lines(stream)
+        else:
+            # Skip the blank-line pass; this can leave whitespace-only lines inside
+            # inline <code>, which minify_html keeps and browsers collapse anyway
+            output = "".join(stream)
+            logger.info("Minifying HTML...")
+            import minify_html
+
+            chunks = [minify_html.minify(output, minify_js=True, minify_css=True)]
+
+        if output_path is None:
+            logger.info("Writing to stdout...")
+            sys.stdout.reconfigure(encoding="utf-8")
+            if not _write_chunks(sys.stdout, chunks).endswith("\n"):
+                sys.stdout.write("\n")
+        else:
+            logger.info(f"Writing output to {output_path}...")
+            _write_file(output_path, chunks)
+    finally:
+        # Release the element references held by the memoized filters,
+        # also when rendering or writing fails
+        elem_path_attrs.cache_clear()
+        elem_name_attrs.cache_clear()
 
     logger.info("Done.")
 